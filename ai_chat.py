@@ -4,10 +4,24 @@ Returns responses as unified diffs.
 """
 
 import os
-import json
+import queue
+import threading
+
 import requests
 from dotenv import load_dotenv
 
+# orjson decodes the small per-token SSE payloads several times faster than
+# the stdlib and takes bytes directly; fall back to json when not installed.
+try:
+    from orjson import loads as _json_loads, dumps as _json_dumps
+except ImportError:
+    import json as _json
+
+    _json_loads = _json.loads
+
+    def _json_dumps(obj) -> bytes:
+        return _json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
 import db
 
 load_dotenv()
@@ -15,6 +29,14 @@ load_dotenv()
 INVOKE_URL = "https://integrate.api.nvidia.com/v1/chat/completions"
 MODEL = "qwen/qwen3.5-397b-a17b"
 
+# One session for the process so keep-alive connections are reused across
+# chat turns instead of paying a fresh TCP+TLS handshake per message.
+_SESSION = requests.Session()
+_SESSION.mount(
+    "https://",
+    requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4),
+)
+
 _SYSTEM_PROMPT_TEMPLATE = """You are an expert software engineer assistant.
 You are working with a specific codebase provided below.
 
@@ -39,19 +61,151 @@ IMPORTANT RULES:
 """
 
 
+# Formatted system prompts are big (~300k chars); cache them per codebase so
+# each chat turn doesn't re-fetch and re-format the full context. Entries are
+# keyed by the context's updated_at, so a re-index invalidates automatically.
+_PROMPT_CACHE: dict[int, tuple[str, str]] = {}  # codebase_id -> (updated_at, prompt)
+
+# Sampling parameters — everything in the request body except model/messages
+_SAMPLING_PARAMS = {
+    "max_tokens": 16384,
+    "temperature": 0.60,
+    "top_p": 0.95,
+    "top_k": 20,
+    "presence_penalty": 0,
+    "repetition_penalty": 1,
+    "stream": True,
+    "chat_template_kwargs": {"enable_thinking": True},
+}
+
+# Serialized request body, split around the messages array so only the new
+# user message needs encoding per turn. The prefix (system prompt + history,
+# by far the bulk of the body) is cached per codebase and extended after each
+# turn; re-serializing a long history every message costs time linear in the
+# whole conversation. Keyed by context updated_at so a re-index invalidates.
+_PAYLOAD_HEAD = b'{"model":' + _json_dumps(MODEL) + b',"messages":['
+_PAYLOAD_TAIL = b"]," + _json_dumps(_SAMPLING_PARAMS)[1:]
+_PAYLOAD_PREFIX: dict[int, tuple[str | None, bytearray]] = {}  # codebase_id -> (updated_at, prefix)
+
+
+_CONTENT_KEY = b'"content":"'
+_CONTENT_NAME = b'"content"'
+
+
+def _extract_content(data_bytes: bytes) -> str | None:
+    """
+    Pull the delta content string out of a streamed event without building the
+    whole JSON tree — the payload shape is known and content is the only field
+    we read. Returns "" when the event has no content field, or None when the
+    fast scan can't handle it (caller falls back to a full JSON parse).
+    """
+    i = data_bytes.find(_CONTENT_KEY)
+    if i < 0:
+        # A content key serialized with different formatting (e.g. a space
+        # after the colon, or a null value) won't match the compact pattern;
+        # punt so those tokens aren't silently dropped. Only a genuinely
+        # content-free event takes the "" shortcut.
+        return None if _CONTENT_NAME in data_bytes else ""
+
+    j = i + len(_CONTENT_KEY)
+    k = j
+    while True:
+        k = data_bytes.find(b'"', k)
+        if k < 0:
+            return None  # unterminated string — punt to the real parser
+        # A quote is the terminator only if preceded by an even number of
+        # backslashes
+        b = k - 1
+        while b >= j and data_bytes[b] == 0x5C:
+            b -= 1
+        if (k - 1 - b) % 2 == 0:
+            break
+        k += 1
+
+    raw = data_bytes[j:k]
+    if b"\\" not in raw:
+        return raw.decode("utf-8", errors="replace")
+    # Escapes present (\n, \", \uXXXX, ...) — decode just the string token
+    try:
+        return _json_loads(b'"' + raw + b'"')
+    except ValueError:
+        return None
+
+
 def _get_api_key() -> str | None:
     return os.environ.get("NVIDIA_API_KEY")
 
 
 def _build_system_prompt(codebase_id: int) -> str:
-    context = db.get_context(codebase_id) or "(No context available)"
-    return _SYSTEM_PROMPT_TEMPLATE.format(context=context)
+    updated_at = db.get_context_updated_at(codebase_id)
+    cached = _PROMPT_CACHE.get(codebase_id)
+    if cached is not None and cached[0] == updated_at:
+        return cached[1]
+
+    row = db.get_context(codebase_id)
+    context = row[0] if row else "(No context available)"
+    prompt = _SYSTEM_PROMPT_TEMPLATE.format(context=context)
+    if updated_at is not None:
+        _PROMPT_CACHE[codebase_id] = (updated_at, prompt)
+    return prompt
 
 
 def check_api_key() -> bool:
     return bool(_get_api_key())
 
 
+def reset_chat(codebase_id: int):
+    """Clear stored chat history and drop the cached payload prefix."""
+    db.clear_chat_history(codebase_id)
+    _PAYLOAD_PREFIX.pop(codebase_id, None)
+
+
+def _stream_reader(response, chunks: queue.Queue, parts: list[str], error: list[Exception]):
+    """
+    Network side of the stream: read large chunks, split SSE lines, extract
+    content, and push chunks onto the queue. Runs on a worker thread so the
+    caller's terminal printing never backpressures the socket. Always pushes
+    a final None sentinel; failures are reported through `error`.
+    """
+    done = False
+    # Read large chunks and split SSE lines ourselves — iter_lines() reads
+    # byte-by-byte and is far too slow for long streamed responses.
+    buf = bytearray()
+    try:
+        for raw_chunk in response.iter_content(chunk_size=65536):
+            buf.extend(raw_chunk)
+            while True:
+                nl = buf.find(b"\n")
+                if nl < 0:
+                    break
+                line = bytes(buf[:nl])
+                del buf[:nl + 1]
+                if not line.startswith(b"data: "):
+                    continue
+                # Stay in bytes — both loaders take bytes, so no decode per event
+                data_bytes = line[6:]
+                if data_bytes.strip() == b"[DONE]":
+                    done = True
+                    break
+                chunk = _extract_content(data_bytes)
+                if chunk is None:
+                    # Fast scan punted — do the full parse
+                    try:
+                        data = _json_loads(data_bytes)
+                        chunk = data["choices"][0]["delta"].get("content", "")
+                    except (ValueError, LookupError):
+                        continue
+                if chunk:
+                    parts.append(chunk)
+                    chunks.put(chunk)
+            if done:
+                break
+    except Exception as e:
+        error.append(e)
+    finally:
+        chunks.put(None)
+
+
 def chat_with_ai(
     codebase_id: int,
     user_message: str,
@@ -66,57 +220,77 @@ def chat_with_ai(
             "No NVIDIA API key found. Set NVIDIA_API_KEY in your .env file or environment."
         )
 
-    # Build history for multi-turn context
-    history = db.get_chat_history(codebase_id)
-    messages = [{"role": "system", "content": _build_system_prompt(codebase_id)}]
-    
-    for msg in history:
-        messages.append({"role": msg["role"], "content": msg["content"]})
-    
-    messages.append({"role": "user", "content": user_message})
+    # Serialized system prompt + history — rebuilt only when missing or when
+    # the codebase was re-indexed since the prefix was cached
+    updated_at = db.get_context_updated_at(codebase_id)
+    cached = _PAYLOAD_PREFIX.get(codebase_id)
+    if cached is None or cached[0] != updated_at:
+        prefix = bytearray(_PAYLOAD_HEAD)
+        prefix += _json_dumps(
+            {"role": "system", "content": _build_system_prompt(codebase_id)}
+        )
+        for msg in db.get_chat_history(codebase_id):
+            prefix += b","
+            prefix += _json_dumps({"role": msg["role"], "content": msg["content"]})
+        _PAYLOAD_PREFIX[codebase_id] = (updated_at, prefix)
+    else:
+        prefix = cached[1]
+
+    user_frag = b"," + _json_dumps({"role": "user", "content": user_message})
+    body = bytes(prefix) + user_frag + _PAYLOAD_TAIL
 
     headers = {
         "Authorization": f"Bearer {api_key}",
-        "Accept": "text/event-stream"
-    }
-
-    payload = {
-        "model": MODEL,
-        "messages": messages,
-        "max_tokens": 16384,
-        "temperature": 0.60,
-        "top_p": 0.95,
-        "top_k": 20,
-        "presence_penalty": 0,
-        "repetition_penalty": 1,
-        "stream": True,
-        "chat_template_kwargs": {"enable_thinking": True},
+        "Accept": "text/event-stream",
+        "Content-Type": "application/json",
     }
 
-    response = requests.post(INVOKE_URL, headers=headers, json=payload, stream=True)
+    response = _SESSION.post(INVOKE_URL, headers=headers, data=body, stream=True)
     response.raise_for_status()
 
-    response_text = ""
-    for line in response.iter_lines():
-        if line:
-            decoded_line = line.decode("utf-8")
-            if decoded_line.startswith("data: "):
-                data_str = decoded_line[6:]
-                if data_str == "[DONE]":
-                    break
-                try:
-                    data = json.loads(data_str)
-                    delta = data["choices"][0]["delta"]
-                    if "content" in delta:
-                        chunk = delta["content"]
-                        response_text += chunk
-                        if on_chunk:
-                            on_chunk(chunk)
-                except json.JSONDecodeError:
-                    continue
+    # Drain the socket on a worker thread and hand chunks to the caller
+    # through a bounded queue — on_chunk usually prints to the terminal,
+    # which can stall long enough to backpressure the socket read.
+    chunks = queue.Queue(maxsize=256)
+    parts: list[str] = []
+    error: list[Exception] = []
+
+    reader = threading.Thread(
+        target=_stream_reader,
+        args=(response, chunks, parts, error),
+        daemon=True,
+    )
+    reader.start()
+
+    item: str | None = ""
+    try:
+        while True:
+            item = chunks.get()
+            if item is None:
+                break
+            if on_chunk:
+                on_chunk(item)
+    finally:
+        if item is not None:
+            # Aborted mid-stream (on_chunk raised, or Ctrl-C): the reader may
+            # be blocked in put() against the full queue, or in the socket
+            # read. Closing the response unblocks the latter and draining to
+            # the sentinel unblocks the former — without both, join() can
+            # hang forever and leak the thread plus its connection.
+            response.close()
+            while chunks.get() is not None:
+                pass
+        reader.join()
+
+    if error:
+        raise error[0]
+
+    response_text = "".join(parts)
 
-    # Persist messages to DB
+    # Persist messages to DB and extend the cached prefix with this turn
     db.add_chat_message(codebase_id, "user", user_message)
     db.add_chat_message(codebase_id, "assistant", response_text)
+    prefix += user_frag
+    prefix += b"," + _json_dumps({"role": "assistant", "content": response_text})
 
     return response_text
@@ -2,23 +2,50 @@
 db.py — SQLite database layer for the Codebase AI Tool.
 """
 
+import atexit
 import sqlite3
 import os
 from datetime import datetime
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "codebases.db")
 
+# One connection for the life of the process. Opening a fresh connection per
+# call (the old pattern) re-runs sqlite3_open + PRAGMA setup on every hot-path
+# query. The CLI is single-threaded; check_same_thread=False just lets worker
+# threads (e.g. streaming callbacks) touch it too.
+_CONN: sqlite3.Connection | None = None
+
+
+def _dict_factory(cursor, row) -> dict:
+    # Rows come out as plain dicts in one pass — cheaper than materializing
+    # sqlite3.Row objects and re-wrapping them with dict(r) at every call site.
+    return {d[0]: row[i] for i, d in enumerate(cursor.description)}
+
 
 def get_connection() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON")
-    return conn
+    global _CONN
+    if _CONN is None:
+        _CONN = sqlite3.connect(DB_PATH, check_same_thread=False)
+        _CONN.row_factory = _dict_factory
+        _CONN.execute("PRAGMA foreign_keys = ON")
+        atexit.register(_CONN.close)
+    return _CONN
 
 
 def init_db():
     """Create all tables if they don't already exist."""
     conn = get_connection()
+    # journal_mode=WAL persists in the database file; the rest are cheap to
+    # (re)apply here once per run. WAL + synchronous=NORMAL drops the fsync
+    # per commit that dominates indexing, mmap/cache speed up the big context
+    # and file reads.
+    conn.executescript("""
+        PRAGMA journal_mode = WAL;
+        PRAGMA synchronous = NORMAL;
+        PRAGMA temp_store = MEMORY;
+        PRAGMA mmap_size = 268435456;
+        PRAGMA cache_size = -20000;
+    """)
     with conn:
         conn.executescript("""
             CREATE TABLE IF NOT EXISTS codebases (
@@ -33,7 +60,9 @@ def init_db():
                 codebase_id  INTEGER NOT NULL REFERENCES codebases(id) ON DELETE CASCADE,
                 rel_path     TEXT    NOT NULL,
                 content      TEXT    NOT NULL,
-                language     TEXT
+                language     TEXT,
+                mtime_ns     INTEGER,
+                size         INTEGER
             );
 
             CREATE TABLE IF NOT EXISTS contexts (
@@ -50,8 +79,18 @@ def init_db():
                 content      TEXT    NOT NULL,
                 created_at   TEXT    NOT NULL
             );
+
+            CREATE INDEX IF NOT EXISTS idx_files_cb      ON files(codebase_id, rel_path);
+            CREATE INDEX IF NOT EXISTS idx_chats_cb_time ON chats(codebase_id, created_at);
+            CREATE INDEX IF NOT EXISTS idx_contexts_cb   ON contexts(codebase_id);
         """)
-    conn.close()
+
+    # Migrate databases created before the incremental-indexing columns
+    cols = {c["name"] for c in conn.execute("PRAGMA table_info(files)").fetchall()}
+    if "mtime_ns" not in cols:
+        with conn:
+            conn.execute("ALTER TABLE files ADD COLUMN mtime_ns INTEGER")
+            conn.execute("ALTER TABLE files ADD COLUMN size INTEGER")
 
 
 # ─── Codebases ───────────────────────────────────────────────────────────────
@@ -75,15 +114,13 @@ def add_codebase(name: str, path: str) -> int:
 def get_all_codebases() -> list[dict]:
     conn = get_connection()
     rows = conn.execute("SELECT * FROM codebases ORDER BY added_at DESC").fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
+    return rows
 
 
 def get_codebase_by_id(codebase_id: int) -> dict | None:
     conn = get_connection()
     row = conn.execute("SELECT * FROM codebases WHERE id = ?", (codebase_id,)).fetchone()
-    conn.close()
-    return dict(row) if row else None
+    return row if row else None
 
 
 # ─── Files ────────────────────────────────────────────────────────────────────
@@ -92,7 +129,6 @@ def clear_files(codebase_id: int):
     conn = get_connection()
     with conn:
         conn.execute("DELETE FROM files WHERE codebase_id = ?", (codebase_id,))
-    conn.close()
 
 
 def add_file(codebase_id: int, rel_path: str, content: str, language: str = ""):
@@ -102,7 +138,42 @@ def add_file(codebase_id: int, rel_path: str, content: str, language: str = ""):
             "INSERT INTO files (codebase_id, rel_path, content, language) VALUES (?, ?, ?, ?)",
             (codebase_id, rel_path, content, language),
         )
-    conn.close()
+
+
+def get_file_meta(codebase_id: int) -> dict[str, tuple[int, int]]:
+    """Map rel_path -> (mtime_ns, size) for incremental re-index comparisons."""
+    conn = get_connection()
+    rows = conn.execute(
+        "SELECT rel_path, mtime_ns, size FROM files WHERE codebase_id = ?",
+        (codebase_id,),
+    ).fetchall()
+    return {r["rel_path"]: (r["mtime_ns"], r["size"]) for r in rows}
+
+
+def sync_files(codebase_id: int, changed_rows: list[tuple[str, str, str, int, int]], removed_paths: list[str]):
+    """
+    Apply an incremental index result in one transaction: upsert changed
+    files (rel_path, content, language, mtime_ns, size) and drop removed
+    paths. Unchanged rows are left untouched, so the write cost scales with
+    the number of edits rather than repo size.
+    """
+    conn = get_connection()
+    with conn:
+        if removed_paths:
+            conn.executemany(
+                "DELETE FROM files WHERE codebase_id = ? AND rel_path = ?",
+                [(codebase_id, p) for p in removed_paths],
+            )
+        if changed_rows:
+            conn.executemany(
+                "DELETE FROM files WHERE codebase_id = ? AND rel_path = ?",
+                [(codebase_id, r[0]) for r in changed_rows],
+            )
+            conn.executemany(
+                "INSERT INTO files (codebase_id, rel_path, content, language, mtime_ns, size)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [(codebase_id, *r) for r in changed_rows],
+            )
 
 
 def get_files(codebase_id: int) -> list[dict]:
@@ -111,8 +182,7 @@ def get_files(codebase_id: int) -> list[dict]:
         "SELECT * FROM files WHERE codebase_id = ? ORDER BY rel_path",
         (codebase_id,),
     ).fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
+    return rows
 
 
 def update_file_content(codebase_id: int, rel_path: str, new_content: str):
@@ -122,7 +192,16 @@ def update_file_content(codebase_id: int, rel_path: str, new_content: str):
             "UPDATE files SET content = ? WHERE codebase_id = ? AND rel_path = ?",
             (new_content, codebase_id, rel_path),
         )
-    conn.close()
+
+
+def update_file_contents_bulk(codebase_id: int, items: list[tuple[str, str]]):
+    """Update many files' contents in one transaction; items are (rel_path, content)."""
+    conn = get_connection()
+    with conn:
+        conn.executemany(
+            "UPDATE files SET content = ? WHERE codebase_id = ? AND rel_path = ?",
+            [(content, codebase_id, rel_path) for rel_path, content in items],
+        )
 
 
 # ─── Contexts ─────────────────────────────────────────────────────────────────
@@ -139,16 +218,24 @@ def save_context(codebase_id: int, summary: str):
             """,
             (codebase_id, summary, now),
         )
-    conn.close()
 
 
-def get_context(codebase_id: int) -> str | None:
+def get_context(codebase_id: int) -> tuple[str, str] | None:
+    """Return (summary, updated_at) for the codebase, or None if not indexed."""
+    conn = get_connection()
+    row = conn.execute(
+        "SELECT summary, updated_at FROM contexts WHERE codebase_id = ?", (codebase_id,)
+    ).fetchone()
+    return (row["summary"], row["updated_at"]) if row else None
+
+
+def get_context_updated_at(codebase_id: int) -> str | None:
+    """Cheap freshness probe — fetches only the timestamp, not the summary."""
     conn = get_connection()
     row = conn.execute(
-        "SELECT summary FROM contexts WHERE codebase_id = ?", (codebase_id,)
+        "SELECT updated_at FROM contexts WHERE codebase_id = ?", (codebase_id,)
     ).fetchone()
-    conn.close()
-    return row["summary"] if row else None
+    return row["updated_at"] if row else None
 
 
 # ─── Chats ────────────────────────────────────────────────────────────────────
@@ -161,7 +248,6 @@ def add_chat_message(codebase_id: int, role: str, content: str):
             "INSERT INTO chats (codebase_id, role, content, created_at) VALUES (?, ?, ?, ?)",
             (codebase_id, role, content, now),
         )
-    conn.close()
 
 
 def get_chat_history(codebase_id: int) -> list[dict]:
@@ -170,12 +256,10 @@ def get_chat_history(codebase_id: int) -> list[dict]:
         "SELECT role, content FROM chats WHERE codebase_id = ? ORDER BY created_at",
         (codebase_id,),
     ).fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
+    return rows
 
 
 def clear_chat_history(codebase_id: int):
     conn = get_connection()
     with conn:
         conn.execute("DELETE FROM chats WHERE codebase_id = ?", (codebase_id,))
-    conn.close()
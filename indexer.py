@@ -2,14 +2,33 @@
 indexer.py — Walks a codebase directory, reads source files, and builds a context string.
 """
 
+import io
 import os
 import re
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 
 import db
 
+# tree-sitter gives real AST-based symbols at C parsing speed for the big
+# three languages; the regex path below stays as the fallback when the
+# optional dependency isn't installed.
+try:
+    from tree_sitter_languages import get_parser as _ts_get_parser
+except ImportError:
+    _ts_get_parser = None
+
+# Hyperscan compiles all of a language's patterns into one DFA and scans the
+# file bytes in a single C pass — used for languages tree-sitter doesn't
+# cover (or when tree-sitter isn't installed). Also optional.
+try:
+    import hyperscan as _hyperscan
+except ImportError:
+    _hyperscan = None
+
 # Extensions considered as source/config files
-SUPPORTED_EXTENSIONS = {
+SUPPORTED_EXTENSIONS = frozenset({
     ".py", ".js", ".ts", ".jsx", ".tsx",
     ".java", ".c", ".cpp", ".h", ".cs",
     ".go", ".rs", ".rb", ".php",
@@ -17,7 +36,7 @@ SUPPORTED_EXTENSIONS = {
     ".md", ".json", ".yaml", ".yml",
     ".toml", ".sh", ".bat", ".env",
     ".sql", ".graphql", ".proto",
-}
+})
 
 # Directories to always skip
 SKIP_DIRS = {
@@ -33,89 +52,301 @@ MAX_CONTEXT_CHARS = 300_000
 # Max chars per single file
 MAX_FILE_CHARS = 50_000
 
+# Bytes to read per file — UTF-8 worst case is 4 bytes/char, so this is
+# always enough to fill MAX_FILE_CHARS after decoding
+_MAX_READ_BYTES = MAX_FILE_CHARS * 4
+
+# Files larger than this are skipped outright (minified bundles, lockfile
+# blobs, vendored assets) — their first 50k chars are noise anyway
+_SKIP_FILE_BYTES = 2_000_000
+
+
+_EXT_TO_LANG = {
+    ".py": "python", ".js": "javascript", ".ts": "typescript",
+    ".jsx": "jsx", ".tsx": "tsx", ".java": "java",
+    ".c": "c", ".cpp": "cpp", ".h": "c",
+    ".cs": "csharp", ".go": "go", ".rs": "rust",
+    ".rb": "ruby", ".php": "php", ".html": "html",
+    ".css": "css", ".scss": "scss", ".sh": "bash",
+    ".bat": "batch", ".sql": "sql", ".md": "markdown",
+    ".json": "json", ".yaml": "yaml", ".yml": "yaml",
+    ".toml": "toml", ".graphql": "graphql", ".proto": "protobuf",
+}
+
+# Bound method — the old function rebuilt this dict literal for every file
+_detect_language = _EXT_TO_LANG.get
+
+
+# Symbol patterns per language. The leading [ \t]* mirrors the old per-line
+# strip() so indented definitions (methods, nested functions) still match.
+_SYMBOL_PATTERNS = {
+    "python": [
+        r"^[ \t]*class\s+(\w+)",
+        r"^[ \t]*def\s+(\w+)",
+        r"^[ \t]*async\s+def\s+(\w+)",
+    ],
+    "javascript": [
+        r"^[ \t]*(?:export\s+)?(?:async\s+)?function\s+(\w+)",
+        r"^[ \t]*(?:export\s+)?class\s+(\w+)",
+        r"^[ \t]*(?:export\s+)?const\s+(\w+)\s*=\s*(?:async\s+)?\(",
+    ],
+    "typescript": [
+        r"^[ \t]*(?:export\s+)?(?:async\s+)?function\s+(\w+)",
+        r"^[ \t]*(?:export\s+)?class\s+(\w+)",
+        r"^[ \t]*(?:export\s+)?interface\s+(\w+)",
+        r"^[ \t]*(?:export\s+)?type\s+(\w+)",
+        r"^[ \t]*(?:export\s+)?const\s+(\w+)\s*=\s*(?:async\s+)?\(",
+    ],
+    "java": [r"^[ \t]*(?:public|private|protected)?\s*(?:static\s+)?(?:\w+\s+)?(\w+)\s*\("],
+    "go": [r"^[ \t]*func\s+(?:\([\w\s*]+\)\s+)?(\w+)"],
+    "rust": [r"^[ \t]*(?:pub\s+)?fn\s+(\w+)"],
+}
+
+# Compile each language's patterns into one alternation, once at import time —
+# the old code re-ran re.match with string patterns per line × per pattern.
+_COMPILED_SYMBOL_RES = {
+    lang: re.compile("|".join(f"(?:{p})" for p in pats), re.MULTILINE)
+    for lang, pats in _SYMBOL_PATTERNS.items()
+}
+
+
+# Languages with tree-sitter grammars we use, and the named definition nodes
+# to pull symbols from
+_TS_LANGUAGES = {"python", "javascript", "typescript"}
+_TS_DEF_NODES = {
+    "function_definition", "class_definition",       # python
+    "function_declaration", "class_declaration",     # js/ts
+    "method_definition", "interface_declaration",
+    "type_alias_declaration",
+}
+_TS_PARSERS: dict = {}  # language -> parser, or False if unavailable
+
+
+def _get_ts_parser(language: str):
+    if _ts_get_parser is None or language not in _TS_LANGUAGES:
+        return None
+    parser = _TS_PARSERS.get(language)
+    if parser is None:
+        try:
+            parser = _ts_get_parser(language)
+        except Exception:
+            parser = False
+        _TS_PARSERS[language] = parser
+    return parser or None
+
+
+def _extract_symbols_ts(content: str, parser) -> list[str]:
+    """AST-based symbol extraction via tree-sitter (C parser, proper scoping)."""
+    tree = parser.parse(content.encode("utf-8"))
+    symbols = []
+    stack = [tree.root_node]
+    while stack:
+        node = stack.pop()
+        if node.type in _TS_DEF_NODES:
+            name = node.child_by_field_name("name")
+            if name is not None:
+                symbols.append(name.text.decode("utf-8", errors="replace"))
+                if len(symbols) >= 30:
+                    break
+        stack.extend(reversed(node.children))  # DFS in document order
+    return symbols
+
+
+_HS_DBS: dict = {}  # language -> (db, per-pattern regexes), or False if unavailable
+
+
+def _get_hs_db(language: str):
+    if _hyperscan is None:
+        return None
+    entry = _HS_DBS.get(language)
+    if entry is None:
+        pats = _SYMBOL_PATTERNS.get(language)
+        if not pats:
+            entry = False
+        else:
+            try:
+                db = _hyperscan.Database()
+                db.compile(
+                    expressions=[p.encode() for p in pats],
+                    ids=list(range(len(pats))),
+                    flags=[_hyperscan.HS_FLAG_MULTILINE | _hyperscan.HS_FLAG_SOM_LEFTMOST] * len(pats),
+                )
+                # Hyperscan reports offsets, not capture groups — keep the
+                # per-pattern Python regexes to pull the name out of each hit.
+                entry = (db, [re.compile(p) for p in pats])
+            except Exception:
+                entry = False
+        _HS_DBS[language] = entry
+    return entry or None
+
+
+def _extract_symbols_hs(content: str, entry) -> list[str]:
+    """Single-pass multi-pattern DFA scan; name extraction only on the hits."""
+    db, singles = entry
+    data = content.encode("utf-8")
+    # Hyperscan reports a match at every end offset where a pattern can
+    # complete — "func main" fires for "m", "ma", "mai", "main" — so keep
+    # only the longest end per start offset; same-start hits from different
+    # patterns are the same definition matched twice.
+    best: dict[int, tuple[int, int]] = {}  # start -> (end, pat_id)
 
-def _detect_language(ext: str) -> str:
-    return {
-        ".py": "python", ".js": "javascript", ".ts": "typescript",
-        ".jsx": "jsx", ".tsx": "tsx", ".java": "java",
-        ".c": "c", ".cpp": "cpp", ".h": "c",
-        ".cs": "csharp", ".go": "go", ".rs": "rust",
-        ".rb": "ruby", ".php": "php", ".html": "html",
-        ".css": "css", ".scss": "scss", ".sh": "bash",
-        ".bat": "batch", ".sql": "sql", ".md": "markdown",
-        ".json": "json", ".yaml": "yaml", ".yml": "yaml",
-        ".toml": "toml", ".graphql": "graphql", ".proto": "protobuf",
-    }.get(ext, "text")
+    def _on_match(pat_id, start, end, flags, context=None):
+        cur = best.get(start)
+        if cur is None or end > cur[0]:
+            best[start] = (end, pat_id)
+
+    db.scan(data, match_event_handler=_on_match)
+
+    symbols = []
+    for start, (end, pat_id) in sorted(best.items()):  # document order
+        m = singles[pat_id].match(data[start:end].decode("utf-8", errors="replace"))
+        if m and m.group(1):
+            symbols.append(m.group(1))
+            if len(symbols) >= 30:
+                break
+    return symbols
 
 
 def _extract_symbols(content: str, language: str) -> list[str]:
-    """Simple regex-based symbol extraction (functions, classes) for context summary."""
+    """Symbol extraction (functions, classes) for the context summary."""
+    parser = _get_ts_parser(language)
+    if parser is not None:
+        try:
+            return _extract_symbols_ts(content, parser)
+        except Exception:
+            pass  # fall through to the regex path
+
+    hs = _get_hs_db(language)
+    if hs is not None:
+        try:
+            return _extract_symbols_hs(content, hs)
+        except Exception:
+            pass  # fall through to the regex path
+
+    regex = _COMPILED_SYMBOL_RES.get(language)
+    if regex is None:
+        return []
+
     symbols = []
-    patterns = {
-        "python": [
-            r"^class\s+(\w+)",
-            r"^def\s+(\w+)",
-            r"^async\s+def\s+(\w+)",
-        ],
-        "javascript": [
-            r"^(?:export\s+)?(?:async\s+)?function\s+(\w+)",
-            r"^(?:export\s+)?class\s+(\w+)",
-            r"^(?:export\s+)?const\s+(\w+)\s*=\s*(?:async\s+)?\(",
-        ],
-        "typescript": [
-            r"^(?:export\s+)?(?:async\s+)?function\s+(\w+)",
-            r"^(?:export\s+)?class\s+(\w+)",
-            r"^(?:export\s+)?interface\s+(\w+)",
-            r"^(?:export\s+)?type\s+(\w+)",
-            r"^(?:export\s+)?const\s+(\w+)\s*=\s*(?:async\s+)?\(",
-        ],
-        "java": [r"^\s*(?:public|private|protected)?\s*(?:static\s+)?(?:\w+\s+)?(\w+)\s*\("],
-        "go": [r"^func\s+(?:\([\w\s*]+\)\s+)?(\w+)"],
-        "rust": [r"^(?:pub\s+)?fn\s+(\w+)"],
-    }.get(language, [])
-
-    for line in content.splitlines():
-        for pat in patterns:
-            m = re.match(pat, line.strip())
-            if m:
-                symbols.append(m.group(1))
-    return symbols[:30]  # Cap at 30 symbols per file to keep context lean
-
-
-def walk_codebase(root_path: str) -> list[dict]:
+    for m in regex.finditer(content):
+        name = next((g for g in m.groups() if g), None)
+        if name:
+            symbols.append(name)
+            if len(symbols) >= 30:  # Cap to keep context lean
+                break
+    return symbols
+
+
+# How many files make spinning up a process pool worth its startup cost
+_SYMBOL_POOL_THRESHOLD = 200
+
+
+def _extract_symbols_tuple(args: tuple[str, str]) -> list[str]:
+    """Module-level shim so ProcessPoolExecutor.map can pickle the call."""
+    return _extract_symbols(*args)
+
+
+def _extract_symbols_batch(files: list[dict]) -> list[list[str]]:
+    """Symbol-extract a batch of files, fanning out to all cores when big."""
+    if len(files) > _SYMBOL_POOL_THRESHOLD:
+        try:
+            with ProcessPoolExecutor() as ex:
+                return list(ex.map(
+                    _extract_symbols_tuple,
+                    [(f["content"], f["language"]) for f in files],
+                    chunksize=32,
+                ))
+        except OSError:
+            pass  # no fork/spawn available — fall back to in-process
+    return [_extract_symbols(f["content"], f["language"]) for f in files]
+
+
+def _read_one(entry: tuple[str, str, str]) -> tuple[str, str, str | None]:
+    """Read one file for the thread pool; returns (rel_path, ext, content)."""
+    rel_path, ext, filepath = entry
+    try:
+        # Never pull a huge file into memory just to truncate it — read only
+        # as many bytes as can possibly survive the char cap.
+        with open(filepath, "rb") as fh:
+            raw = fh.read(_MAX_READ_BYTES + 1)
+    except Exception:
+        return rel_path, ext, None
+
+    content = raw.decode("utf-8", errors="replace")
+    if len(content) > MAX_FILE_CHARS or len(raw) > _MAX_READ_BYTES:
+        content = content[:MAX_FILE_CHARS] + "\n... [truncated]"
+    return rel_path, ext, content
+
+
+def walk_codebase(root_path: str, known_meta: dict[str, tuple[int, int]] | None = None) -> list[dict]:
     """
     Walk the directory tree and collect all readable source files.
-    Returns a list of dicts: {rel_path, content, language}.
+    Returns a list of dicts: {rel_path, content, language, mtime_ns, size, changed}.
+
+    `known_meta` maps rel_path -> (mtime_ns, size) from a previous index run;
+    files whose stat still matches are returned with content=None and
+    changed=False so the caller can reuse the stored copy instead of
+    re-reading from disk.
     """
-    root = Path(root_path).resolve()
-    collected = []
+    known_meta = known_meta or {}
+
+    # Plain string paths throughout — constructing a pathlib.Path per file is
+    # an order of magnitude slower than os.path string ops on a big walk
+    root_str = os.path.realpath(root_path)
+    root_len = len(root_str) + 1  # +1 for the separator
 
-    for dirpath, dirnames, filenames in os.walk(root):
+    # First pass: collect candidate paths and stat them (metadata only)
+    candidates: list[tuple[str, str, str, int, int, bool]] = []
+    for dirpath, dirnames, filenames in os.walk(root_str):
         # Prune skipped dirs in-place so os.walk doesn't recurse into them
         dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS and not d.startswith(".")]
 
         for filename in sorted(filenames):
-            filepath = Path(dirpath) / filename
-            ext = filepath.suffix.lower()
-
+            # Check the extension on the raw name first — no point doing path
+            # work on files we're going to skip
+            ext = os.path.splitext(filename)[1].lower()
             if ext not in SUPPORTED_EXTENSIONS:
                 continue
 
-            rel_path = str(filepath.relative_to(root)).replace("\\", "/")
-
+            full = os.path.join(dirpath, filename)
+            rel_path = full[root_len:].replace("\\", "/")
             try:
-                content = filepath.read_text(encoding="utf-8", errors="replace")
-            except Exception:
+                st = os.stat(full)
+            except OSError:
+                continue
+            if st.st_size > _SKIP_FILE_BYTES:
                 continue
 
-            if len(content) > MAX_FILE_CHARS:
-                content = content[:MAX_FILE_CHARS] + "\n... [truncated]"
+            changed = known_meta.get(rel_path) != (st.st_mtime_ns, st.st_size)
+            # Intern — each rel_path is reused in the file tree, symbol index,
+            # content headings and DB rows, so share one string object
+            candidates.append((sys.intern(rel_path), ext, full, st.st_mtime_ns, st.st_size, changed))
+
+    # Second pass: read only changed files, in parallel — the reads release
+    # the GIL on the underlying syscalls, so threads overlap disk latency.
+    contents: dict[str, str | None] = {}
+    to_read = [(rel, ext, full) for rel, ext, full, _, _, changed in candidates if changed]
+    if to_read:
+        with ThreadPoolExecutor(max_workers=16) as ex:
+            for rel_path, ext, content in ex.map(_read_one, to_read):
+                contents[rel_path] = content
 
-            collected.append({
-                "rel_path": rel_path,
-                "content": content,
-                "language": _detect_language(ext),
-            })
+    collected = []
+    for rel_path, ext, full, mtime_ns, size, changed in candidates:
+        if changed:
+            content = contents.get(rel_path)
+            if content is None:  # unreadable
+                continue
+        else:
+            content = None  # caller reuses the stored copy
+        collected.append({
+            "rel_path": rel_path,
+            "content": content,
+            "language": _detect_language(ext, "text"),
+            "mtime_ns": mtime_ns,
+            "size": size,
+            "changed": changed,
+        })
 
     return collected
 
@@ -126,57 +357,86 @@ def build_context(root_path: str, files: list[dict]) -> str:
     This becomes the AI system prompt backdrop.
     """
     root = Path(root_path).resolve()
-    lines = []
+    # Write into one growable buffer instead of collecting blocks in a list
+    # and joining at the end — the join copies every byte a second time.
+    buf = io.StringIO()
+    write = buf.write
 
     # ── Header ───────────────────────────────────────────────
-    lines.append(f"# Codebase: {root.name}")
-    lines.append(f"Root path: {root}")
-    lines.append(f"Total indexed files: {len(files)}\n")
+    write(f"# Codebase: {root.name}\n")
+    write(f"Root path: {root}\n")
+    write(f"Total indexed files: {len(files)}\n\n")
 
     # ── File tree ─────────────────────────────────────────────
-    lines.append("## File Tree")
+    write("## File Tree\n")
     for f in files:
-        lines.append(f"  {f['rel_path']}")
-    lines.append("")
+        write(f"  {f['rel_path']}\n")
+    write("\n")
+
+    # Files past the content budget are omitted below, so running the symbol
+    # regexes over them is wasted work — find the cutoff up front. The
+    # estimate only needs to be rough (block overhead is ~20 chars + markup).
+    cutoff = len(files)
+    projected = MAX_CONTEXT_CHARS - buf.tell()
+    for i, f in enumerate(files):
+        projected -= len(f["content"]) + len(f["rel_path"]) + len(f["language"]) + 20
+        if projected <= 0:
+            cutoff = i + 1  # keep the boundary file — the real check may still fit it
+            break
 
     # ── Per-file symbol summaries ──────────────────────────────
-    lines.append("## Symbol Index")
-    for f in files:
-        symbols = _extract_symbols(f["content"], f["language"])
+    write("## Symbol Index\n")
+    to_scan = files[:cutoff]
+    for f, symbols in zip(to_scan, _extract_symbols_batch(to_scan)):
         if symbols:
-            lines.append(f"### {f['rel_path']}")
-            lines.append(", ".join(symbols))
-    lines.append("")
+            write(f"### {f['rel_path']}\n")
+            write(", ".join(symbols))
+            write("\n")
+    write("\n")
 
     # ── Full file contents (within budget) ────────────────────
-    lines.append("## File Contents")
-    total_chars = len("\n".join(lines))
+    write("## File Contents")
+    total_chars = buf.tell()
 
     for f in files:
-        block = f"\n### {f['rel_path']}\n```{f['language']}\n{f['content']}\n```"
+        block = f"\n\n### {f['rel_path']}\n```{f['language']}\n{f['content']}\n```"
         if total_chars + len(block) > MAX_CONTEXT_CHARS:
-            lines.append(f"\n[... remaining files omitted — context budget reached ...]")
+            write("\n\n[... remaining files omitted — context budget reached ...]")
             break
-        lines.append(block)
+        write(block)
         total_chars += len(block)
 
-    return "\n".join(lines)
+    return buf.getvalue()
 
 
 def index_codebase(codebase_id: int, root_path: str) -> tuple[int, str]:
     """
     Full indexing pipeline:
-      1. Walk directory
-      2. Store files in DB
+      1. Walk directory (incrementally — unchanged files are not re-read)
+      2. Store changed files in DB, drop removed ones
       3. Build and store context
     Returns (file_count, context_summary).
     """
-    files = walk_codebase(root_path)
-
-    # Persist files
-    db.clear_files(codebase_id)
-    for f in files:
-        db.add_file(codebase_id, f["rel_path"], f["content"], f["language"])
+    existing_meta = db.get_file_meta(codebase_id)
+    files = walk_codebase(root_path, known_meta=existing_meta)
+
+    # Unchanged files were not read from disk — pull their stored content in
+    # one SELECT so the context rebuild still sees everything
+    if any(f["content"] is None for f in files):
+        stored = {row["rel_path"]: row["content"] for row in db.get_files(codebase_id)}
+        for f in files:
+            if f["content"] is None:
+                f["content"] = stored.get(f["rel_path"], "")
+
+    # Persist the delta — changed/new files plus deletions, one transaction
+    current_paths = {f["rel_path"] for f in files}
+    removed = [p for p in existing_meta if p not in current_paths]
+    changed_rows = [
+        (f["rel_path"], f["content"], f["language"], f["mtime_ns"], f["size"])
+        for f in files
+        if f["changed"]
+    ]
+    db.sync_files(codebase_id, changed_rows, removed)
 
     # Build and persist context
     context = build_context(root_path, files)
@@ -10,21 +10,15 @@ from pathlib import Path
 
 # ── Bootstrap: install dependencies if missing ────────────────────────────────
 def _ensure_deps():
-    import importlib, subprocess
-    packages = {
-        "rich": "rich",
-        "requests": "requests",
-        "dotenv": "python-dotenv",
-    }
-    missing = []
-    for mod, pkg in packages.items():
-        try:
-            importlib.import_module(mod)
-        except ImportError:
-            missing.append(pkg)
-    if missing:
-        print(f"[setup] Installing missing packages: {', '.join(missing)} …")
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "--quiet", *missing])
+    # Single import probe — on a healthy install this costs nothing extra,
+    # since the modules are needed (and cached) right below anyway.
+    try:
+        import rich, requests, dotenv  # noqa: F401
+    except ImportError:
+        import subprocess
+        packages = ["rich", "requests", "python-dotenv"]
+        print(f"[setup] Installing missing packages: {', '.join(packages)} …")
+        subprocess.check_call([sys.executable, "-m", "pip", "install", "--quiet", *packages])
         print("[setup] Done. Continuing …\n")
 
 _ensure_deps()
@@ -204,7 +198,7 @@ def option_chat():
             break
 
         if user_input.lower() == "clear":
-            db.clear_chat_history(codebase_id)
+            ai_chat.reset_chat(codebase_id)
             console.print("[yellow]Chat history cleared.[/]")
             continue
 
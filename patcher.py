@@ -2,17 +2,71 @@
 patcher.py — Parse and apply unified diffs to a codebase on disk.
 """
 
+import difflib
+import functools
+import itertools
+import mmap
 import re
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import NamedTuple
 
 import db
 
+# Prefer the battle-tested unidiff parser when installed; the hand-rolled
+# state machine below stays as the fallback
+try:
+    import unidiff as _unidiff
+except ImportError:
+    _unidiff = None
 
-class HunkLine(NamedTuple):
-    op: str      # ' ' (context), '+' (add), '-' (remove)
-    text: str
+# Compiled once — parse_diff hits the hunk-header pattern on every diff line
+# and extract_diff_from_response runs per AI response
+_HUNK_HEADER_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+_HUNK_HEADER_RE_B = re.compile(rb"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+_FENCED_RE = re.compile(r"```(?:diff)?\s*\n(.*?)```", re.DOTALL)
+
+
+# A hunk body line is a bare (op, text) tuple: op is ' ' (context), '+' (add)
+# or '-' (remove). One of these exists per diff line, so the NamedTuple that
+# used to live here was pure construction overhead in the parse hot path.
+HunkLine = tuple[str, str]
+
+
+class _LazyHunkLines:
+    """
+    Sequence of HunkLine tuples that defers the per-line ``line[1:]`` slice.
+
+    The hand parser stores the raw diff lines (op char still attached) and
+    the (op, text) tuples are built once, on first iteration. Each slice is
+    a full-line memcpy, so a diff that is parsed for display and then
+    declined never pays for any of them.
+    """
+    __slots__ = ("_raw", "_lines")
+
+    def __init__(self, raw: list[str]):
+        self._raw = raw
+        self._lines: list[HunkLine] | None = None
+
+    def _materialize(self) -> list[HunkLine]:
+        lines = self._lines
+        if lines is None:
+            # "" ops come from blank context lines that lost their space
+            lines = self._lines = [(r[:1] or " ", r[1:]) for r in self._raw]
+        return lines
+
+    def __iter__(self):
+        return iter(self._materialize())
+
+    def __len__(self) -> int:
+        return len(self._raw)
+
+    def __getitem__(self, i):
+        return self._materialize()[i]
+
+    def __eq__(self, other) -> bool:
+        return self._materialize() == other
 
 
 class Hunk(NamedTuple):
@@ -20,7 +74,7 @@ class Hunk(NamedTuple):
     old_count: int
     new_start: int
     new_count: int
-    lines: list[HunkLine]
+    lines: list[HunkLine] | _LazyHunkLines
 
 
 class FilePatch(NamedTuple):
@@ -33,31 +87,86 @@ class FilePatch(NamedTuple):
 
 def _strip_path_prefix(p: str) -> str:
     """Remove the a/ or b/ prefix from unified diff paths."""
-    if p.startswith(("a/", "b/")):
-        return p[2:]
+    # Slice-and-compare beats startswith with a tuple argument: no method
+    # call, no tuple iteration. /dev/null is checked first since it can
+    # never carry a prefix.
     if p == "/dev/null":
         return ""
+    if p[:2] in ("a/", "b/"):
+        return p[2:]
     return p
 
 
+def _parse_diff_unidiff(diff_text: str) -> list[FilePatch]:
+    """Parse via unidiff.PatchSet, adapted into the FilePatch structures."""
+    patches: list[FilePatch] = []
+    for pf in _unidiff.PatchSet(diff_text):
+        hunks: list[Hunk] = []
+        for h in pf:
+            hunk_lines: list[HunkLine] = []
+            for l in h:
+                if l.is_added:
+                    op = "+"
+                elif l.is_removed:
+                    op = "-"
+                elif l.is_context:
+                    op = " "
+                else:
+                    continue  # "\ No newline at end of file" markers
+                # unidiff keeps the terminator; strip \n and \r so CRLF
+                # diffs don't smuggle a trailing \r into line text
+                hunk_lines.append((op, l.value.rstrip("\r\n")))
+            hunks.append(Hunk(h.source_start, h.source_length,
+                              h.target_start, h.target_length, hunk_lines))
+        patches.append(FilePatch(
+            _strip_path_prefix(pf.source_file.strip()),
+            _strip_path_prefix(pf.target_file.strip()),
+            hunks,
+        ))
+    return patches
+
+
 def parse_diff(diff_text: str) -> list[FilePatch]:
     """
     Parse a unified diff string into a list of FilePatch objects.
     Handles standard `--- a/... +++ b/...` format as well as bare paths.
     """
+    # The same diff is parsed twice per accepted patch (display, then apply),
+    # so memoize small ones. Huge diffs bypass the cache — keeping megabyte
+    # strings alive as cache keys costs more than the re-parse.
+    if len(diff_text) >= 1_000_000:
+        return _parse_diff_uncached(diff_text)
+    return _parse_diff_cached(diff_text)
+
+
+def _parse_diff_uncached(diff_text: str) -> list[FilePatch]:
+    if _unidiff is not None:
+        try:
+            patches = _parse_diff_unidiff(diff_text)
+            if patches:
+                return patches
+        except Exception:
+            pass  # malformed for the strict parser — use the lenient one
+
     patches: list[FilePatch] = []
     lines = diff_text.splitlines()
+    # Locals for the hot loop — every LOAD_GLOBAL/LOAD_METHOD saved here runs
+    # once per diff line
+    n = len(lines)
+    hunk_header_match = _HUNK_HEADER_RE.match
     i = 0
 
-    while i < len(lines):
-        # Find the start of a file diff block
-        if not lines[i].startswith("---"):
+    while i < n:
+        # Find the start of a file diff block. Slice compares beat startswith
+        # here — no attribute lookup or call frame, just C-level memcmp.
+        line = lines[i]
+        if line[:3] != "---":
             i += 1
             continue
 
-        old_path_raw = lines[i][4:].strip()
+        old_path_raw = line[4:].strip()
         i += 1
-        if i >= len(lines) or not lines[i].startswith("+++"):
+        if i >= n or lines[i][:3] != "+++":
             continue
 
         new_path_raw = lines[i][4:].strip()
@@ -67,10 +176,96 @@ def parse_diff(diff_text: str) -> list[FilePatch]:
         new_path = _strip_path_prefix(new_path_raw.split("\t")[0])
 
         hunks: list[Hunk] = []
+        hunks_append = hunks.append
 
         # Parse hunks belonging to this file
-        while i < len(lines) and not lines[i].startswith("---"):
-            hunk_header = re.match(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@", lines[i])
+        while i < n and lines[i][:3] != "---":
+            hunk_header = hunk_header_match(lines[i])
+            if not hunk_header:
+                i += 1
+                continue
+
+            old_start = int(hunk_header.group(1))
+            old_count = int(hunk_header.group(2) or 1)
+            new_start = int(hunk_header.group(3))
+            new_count = int(hunk_header.group(4) or 1)
+            i += 1
+
+            # Raw lines only — the (op, text) split is deferred to
+            # _LazyHunkLines, so no per-line substring is allocated here
+            raw_lines: list[str] = []
+            raw_append = raw_lines.append
+            # One combined budget instead of separate old/new counters: a
+            # context line consumes one from each side (-2), adds and removes
+            # one (-1). Halves the bookkeeping per line and simplifies the
+            # loop condition to a single compare.
+            remaining = old_count + new_count
+
+            while i < n and remaining > 0:
+                line = lines[i]
+                # Dispatch on the first char — one C-level slice instead of
+                # up to four startswith calls per line
+                op = line[:1]
+                if op == "-":
+                    raw_append(line)
+                    remaining -= 1
+                elif op == "+":
+                    raw_append(line)
+                    remaining -= 1
+                elif op == " " or op == "":
+                    raw_append(line)
+                    remaining -= 2
+                elif op == "\\":
+                    pass  # "No newline at end of file"
+                else:
+                    break
+                i += 1
+
+            hunks_append(Hunk(old_start, old_count, new_start, new_count,
+                              _LazyHunkLines(raw_lines)))
+
+        patches.append(FilePatch(old_path, new_path, hunks))
+
+    return patches
+
+
+_parse_diff_cached = functools.lru_cache(maxsize=128)(_parse_diff_uncached)
+
+
+def parse_diff_bytes(diff_bytes: bytes) -> list[FilePatch]:
+    """
+    parse_diff for raw bytes — skips the up-front decode of the whole diff
+    and only decodes the line payloads that end up in hunks. Worthwhile when
+    the diff arrives as bytes (network body, file read in "rb" mode).
+    """
+    patches: list[FilePatch] = []
+    lines = diff_bytes.split(b"\n")
+    n = len(lines)
+    hunk_header_match = _HUNK_HEADER_RE_B.match
+    i = 0
+
+    while i < n:
+        line = lines[i]
+        if line[:3] != b"---":
+            i += 1
+            continue
+
+        old_path_raw = line[4:].strip()
+        i += 1
+        if i >= n or lines[i][:3] != b"+++":
+            continue
+
+        new_path_raw = lines[i][4:].strip()
+        i += 1
+
+        old_path = _strip_path_prefix(old_path_raw.split(b"\t")[0].decode("utf-8", "replace"))
+        new_path = _strip_path_prefix(new_path_raw.split(b"\t")[0].decode("utf-8", "replace"))
+
+        hunks: list[Hunk] = []
+        hunks_append = hunks.append
+
+        while i < n and lines[i][:3] != b"---":
+            hunk_header = hunk_header_match(lines[i])
             if not hunk_header:
                 i += 1
                 continue
@@ -82,28 +277,30 @@ def parse_diff(diff_text: str) -> list[FilePatch]:
             i += 1
 
             hunk_lines: list[HunkLine] = []
-            old_remaining = old_count
-            new_remaining = new_count
+            hunk_lines_append = hunk_lines.append
+            remaining = old_count + new_count
 
-            while i < len(lines) and (old_remaining > 0 or new_remaining > 0):
+            while i < n and remaining > 0:
                 line = lines[i]
-                if line.startswith("-"):
-                    hunk_lines.append(HunkLine("-", line[1:]))
-                    old_remaining -= 1
-                elif line.startswith("+"):
-                    hunk_lines.append(HunkLine("+", line[1:]))
-                    new_remaining -= 1
-                elif line.startswith(" ") or line == "":
-                    hunk_lines.append(HunkLine(" ", line[1:] if line else ""))
-                    old_remaining -= 1
-                    new_remaining -= 1
-                elif line.startswith("\\"):
+                if line[-1:] == b"\r":
+                    line = line[:-1]
+                op = line[:1]
+                if op == b"-":
+                    hunk_lines_append(("-", line[1:].decode("utf-8", "replace")))
+                    remaining -= 1
+                elif op == b"+":
+                    hunk_lines_append(("+", line[1:].decode("utf-8", "replace")))
+                    remaining -= 1
+                elif op == b" " or op == b"":
+                    hunk_lines_append((" ", line[1:].decode("utf-8", "replace")))
+                    remaining -= 2
+                elif op == b"\\":
                     pass  # "No newline at end of file"
                 else:
                     break
                 i += 1
 
-            hunks.append(Hunk(old_start, old_count, new_start, new_count, hunk_lines))
+            hunks_append(Hunk(old_start, old_count, new_start, new_count, hunk_lines))
 
         patches.append(FilePatch(old_path, new_path, hunks))
 
@@ -112,50 +309,178 @@ def parse_diff(diff_text: str) -> list[FilePatch]:
 
 # ─── Applying ────────────────────────────────────────────────────────────────
 
-def _apply_hunk(file_lines: list[str], hunk: Hunk) -> list[str] | None:
+# Matching strategies for a hunk window, tried strictest-first. The exact
+# comparison short-circuits on the happy path, so well-formed patches pay a
+# single C-level list compare; the looser stages only run when the file has
+# drifted from what the LLM saw (whitespace churn, re-indentation, ...).
+
+def _match_exact(window: list[str], old_lines: list[str]) -> bool:
+    return window == old_lines
+
+
+def _match_trimmed(window: list[str], old_lines: list[str]) -> bool:
+    return [l.rstrip() for l in window] == [l.rstrip() for l in old_lines]
+
+
+def _match_ws_normalized(window: list[str], old_lines: list[str]) -> bool:
+    return [" ".join(l.split()) for l in window] == [" ".join(l.split()) for l in old_lines]
+
+
+def _match_indent_flexible(window: list[str], old_lines: list[str]) -> bool:
+    return [l.lstrip() for l in window] == [l.lstrip() for l in old_lines]
+
+
+def _match_block_anchor(window: list[str], old_lines: list[str]) -> bool:
+    # Anchor on the first and last lines, then accept if the middle is
+    # similar enough — catches small edits inside an otherwise-right block
+    if len(old_lines) < 3 or len(window) != len(old_lines):
+        return False
+    if window[0].strip() != old_lines[0].strip() or window[-1].strip() != old_lines[-1].strip():
+        return False
+    ratio = difflib.SequenceMatcher(
+        None, "\n".join(window[1:-1]), "\n".join(old_lines[1:-1])
+    ).ratio()
+    return ratio > 0.3
+
+
+_MATCH_STRATEGIES = (
+    _match_exact,
+    _match_trimmed,
+    _match_ws_normalized,
+    _match_indent_flexible,
+    _match_block_anchor,
+)
+
+
+def _apply_hunk(window: list[str], hunk: Hunk) -> list[str] | None:
     """
-    Apply a single hunk to file_lines (0-indexed list of lines without newlines).
-    Returns the modified list or None if the hunk context doesn't match.
+    Given the file lines the hunk covers, return the replacement lines, or
+    None if the window doesn't match the hunk's context under any strategy.
     """
-    result = []
-    src_idx = 0         # current index into file_lines
-    hunk_start = hunk.old_start - 1  # convert to 0-indexed
+    old_lines = [text for op, text in hunk.lines if op != "+"]
 
-    # Copy everything before the hunk
-    result.extend(file_lines[:hunk_start])
-    src_idx = hunk_start
+    if len(window) != len(old_lines):
+        return None
 
+    if not any(match(window, old_lines) for match in _MATCH_STRATEGIES):
+        return None
+
+    # Emit the file's own context lines (not the diff's copy) so whatever
+    # formatting drift the fuzzy match tolerated is preserved
+    new_lines: list[str] = []
+    idx = 0
     for op, text in hunk.lines:
         if op == " ":
-            # Context line — must match
-            if src_idx >= len(file_lines):
-                return None
-            result.append(file_lines[src_idx])
-            src_idx += 1
+            new_lines.append(window[idx])
+            idx += 1
         elif op == "-":
-            # Remove line — verify it roughly matches
-            if src_idx >= len(file_lines):
-                return None
-            src_idx += 1
-        elif op == "+":
-            # Add line
-            result.append(text)
+            idx += 1
+        else:
+            new_lines.append(text)
 
-    # Copy everything after the hunk
-    result.extend(file_lines[src_idx:])
-    return result
+    return new_lines
 
 
-def apply_patch(patch: FilePatch, root_path: str) -> tuple[bool, str]:
+# Above this size apply_patch goes through mmap instead of read_text: the
+# untouched bulk of the file never gets decoded to str, only each hunk's
+# window does.
+_MMAP_THRESHOLD = 1 << 20  # 1 MiB
+
+
+def _write_atomic(abs_path: Path, data: bytes):
+    """Write data to abs_path via a pid-suffixed tmp file and os.replace."""
+    tmp_path = abs_path.with_suffix(abs_path.suffix + f".tmp.{os.getpid()}")
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    try:
+        os.write(fd, data)
+        os.close(fd)
+        os.replace(tmp_path, abs_path)
+    except BaseException:
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _apply_patch_large(patch: FilePatch, abs_path: Path, rel: str) -> tuple[bool, str, str | None]:
     """
-    Apply all hunks of a FilePatch to the file on disk.
-    Returns (success, message).
+    apply_patch's big-file branch: the original stays an mmap'd byte buffer,
+    offsets are found with mm.find, and only hunk windows are decoded. The
+    untouched regions travel to the output as raw byte slices — no str
+    round-trip for megabytes of unchanged content.
+    """
+    try:
+        with open(abs_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            total = len(mm)
+            offsets = [0]
+            pos = mm.find(b"\n")
+            while pos != -1:
+                offsets.append(pos + 1)
+                pos = mm.find(b"\n", pos + 1)
+            if offsets[-1] == total:
+                n_lines = len(offsets) - 1
+            else:
+                n_lines = len(offsets)
+
+            def line_at(i: int) -> str:
+                end = offsets[i + 1] - 1 if i + 1 < len(offsets) else total
+                line = mm[offsets[i]:end].decode("utf-8", errors="replace")
+                return line[:-1] if line.endswith("\r") else line
+
+            replacements: list[tuple[int, int, bytes]] = []
+            for hunk in patch.hunks:
+                start = max(hunk.old_start - 1, 0)
+                old_count = sum(1 for op, _ in hunk.lines if op != "+")
+                if start + old_count > n_lines:
+                    return False, f"Hunk mismatch in {rel} at line {hunk.old_start}. Patch may be stale.", None
+
+                window = [line_at(i) for i in range(start, start + old_count)]
+                new_lines = _apply_hunk(window, hunk)
+                if new_lines is None:
+                    return False, f"Hunk mismatch in {rel} at line {hunk.old_start}. Patch may be stale.", None
+
+                char_start = offsets[start] if start < len(offsets) else total
+                end_line = start + old_count
+                char_end = offsets[end_line] if end_line < len(offsets) else total
+                replacement = "".join(l + "\n" for l in new_lines).encode("utf-8")
+                replacements.append((char_start, char_end, replacement))
+
+            replacements.sort(key=lambda r: r[0])
+            parts: list[bytes] = []
+            prev = 0
+            for char_start, char_end, text in replacements:
+                if char_start < prev:
+                    return False, f"Overlapping hunks in {rel}. Patch may be stale.", None
+                parts.append(mm[prev:char_start])
+                parts.append(text)
+                prev = char_end
+            parts.append(mm[prev:])
+    except Exception as e:
+        return False, f"Cannot read {rel}: {e}", None
+
+    data = b"".join(parts)
+    if not data.endswith(b"\n"):
+        data += b"\n"
+
+    _write_atomic(abs_path, data)
+    return True, f"Patched: {rel}", data.decode("utf-8", errors="replace")
+
+
+def apply_patch(patch: FilePatch, root: Path) -> tuple[bool, str, str | None]:
+    """
+    Apply all hunks of a FilePatch to the file on disk. `root` must already
+    be resolved — resolve() stats every path component, so callers do it once
+    for the whole diff rather than per file.
+    Returns (success, message, patched_content) — the content is handed back
+    so callers can sync the DB without re-reading the file just written.
     """
-    root = Path(root_path).resolve()
     rel = patch.new_path or patch.old_path
 
     if not rel:
-        return False, "Could not determine file path from diff."
+        return False, "Could not determine file path from diff.", None
 
     abs_path = root / rel
 
@@ -163,15 +488,18 @@ def apply_patch(patch: FilePatch, root_path: str) -> tuple[bool, str]:
     if not patch.old_path:
         try:
             abs_path.parent.mkdir(parents=True, exist_ok=True)
-            content = ""
-            for hunk in patch.hunks:
-                for op, text in hunk.lines:
-                    if op in ("+", " "):
-                        content += text + "\n"
+            # Join once — += on a str reallocates the whole buffer per line
+            parts = [
+                text
+                for hunk in patch.hunks
+                for op, text in hunk.lines
+                if op in ("+", " ")
+            ]
+            content = "\n".join(parts) + ("\n" if parts else "")
             abs_path.write_text(content, encoding="utf-8")
-            return True, f"Created new file: {rel}"
+            return True, f"Created new file: {rel}", content
         except Exception as e:
-            return False, f"Failed to create {rel}: {e}"
+            return False, f"Failed to create {rel}: {e}", None
 
     if not abs_path.exists():
         # Try the old path
@@ -180,27 +508,74 @@ def apply_patch(patch: FilePatch, root_path: str) -> tuple[bool, str]:
             abs_path = old_abs
             rel = patch.old_path
         else:
-            return False, f"File not found: {rel}"
+            return False, f"File not found: {rel}", None
 
     try:
+        if abs_path.stat().st_size > _MMAP_THRESHOLD:
+            return _apply_patch_large(patch, abs_path, rel)
         original = abs_path.read_text(encoding="utf-8", errors="replace")
     except Exception as e:
-        return False, f"Cannot read {rel}: {e}"
-
-    file_lines = original.splitlines()
-
-    # Apply hunks in reverse order (to preserve line numbers)
-    for hunk in reversed(patch.hunks):
-        file_lines = _apply_hunk(file_lines, hunk)
-        if file_lines is None:
-            return False, f"Hunk mismatch in {rel} at line {hunk.old_start}. Patch may be stale."
-
-    patched_content = "\n".join(file_lines)
+        return False, f"Cannot read {rel}: {e}", None
+
+    # Hunks carry line numbers, so we only need line-start offsets — not a
+    # materialized string object per line. Untouched regions travel from
+    # `original` to the output as big slices; only each hunk's own window is
+    # ever split into lines.
+    total = len(original)
+    offsets = [0]
+    pos = original.find("\n")
+    while pos != -1:
+        offsets.append(pos + 1)
+        pos = original.find("\n", pos + 1)
+    if not original:
+        n_lines = 0
+    elif offsets[-1] == total:
+        n_lines = len(offsets) - 1  # trailing newline — no extra empty line
+    else:
+        n_lines = len(offsets)
+
+    def line_at(i: int) -> str:
+        end = offsets[i + 1] - 1 if i + 1 < len(offsets) else total
+        line = original[offsets[i]:end]
+        return line[:-1] if line.endswith("\r") else line
+
+    replacements: list[tuple[int, int, str]] = []  # (char_start, char_end, text)
+    for hunk in patch.hunks:
+        start = max(hunk.old_start - 1, 0)  # 0-indexed; -0,0 means insert at top
+        old_count = sum(1 for op, _ in hunk.lines if op != "+")
+        if start + old_count > n_lines:
+            return False, f"Hunk mismatch in {rel} at line {hunk.old_start}. Patch may be stale.", None
+
+        window = [line_at(i) for i in range(start, start + old_count)]
+        new_lines = _apply_hunk(window, hunk)
+        if new_lines is None:
+            return False, f"Hunk mismatch in {rel} at line {hunk.old_start}. Patch may be stale.", None
+
+        char_start = offsets[start] if start < len(offsets) else total
+        end_line = start + old_count
+        char_end = offsets[end_line] if end_line < len(offsets) else total
+        replacements.append((char_start, char_end, "".join(l + "\n" for l in new_lines)))
+
+    # Stitch once, in order; overlapping hunks mean the diff is bogus
+    replacements.sort(key=lambda r: r[0])
+    parts: list[str] = []
+    prev = 0
+    for char_start, char_end, text in replacements:
+        if char_start < prev:
+            return False, f"Overlapping hunks in {rel}. Patch may be stale.", None
+        parts.append(original[prev:char_start])
+        parts.append(text)
+        prev = char_end
+    parts.append(original[prev:])
+
+    patched_content = "".join(parts)
     if not patched_content.endswith("\n"):
         patched_content += "\n"
 
-    abs_path.write_text(patched_content, encoding="utf-8")
-    return True, f"Patched: {rel}"
+    # One raw write of pre-encoded bytes — write_text funnels the string
+    # through TextIOWrapper's chunked codec and newline translation
+    _write_atomic(abs_path, patched_content.encode("utf-8"))
+    return True, f"Patched: {rel}", patched_content
 
 
 def apply_diff_to_codebase(diff_text: str, root_path: str, codebase_id: int) -> list[tuple[bool, str]]:
@@ -213,21 +588,40 @@ def apply_diff_to_codebase(diff_text: str, root_path: str, codebase_id: int) ->
     if not patches:
         return [(False, "No valid patches found in diff.")]
 
-    results = []
-    for patch in patches:
-        ok, msg = apply_patch(patch, root_path)
-        results.append((ok, msg))
-
-        if ok:
-            # Sync updated content back to DB
-            rel = patch.new_path or patch.old_path
-            if rel:
-                abs_path = Path(root_path).resolve() / rel
-                try:
-                    new_content = abs_path.read_text(encoding="utf-8", errors="replace")
-                    db.update_file_content(codebase_id, rel, new_content)
-                except Exception:
-                    pass
+    root = Path(root_path).resolve()
+
+    # Each file's read→patch→write is independent, I/O-bound work, so fan out
+    # across threads — but patches touching the same file must stay in order,
+    # so group by target path and serialize within a group.
+    groups: dict[str, list[int]] = {}
+    for idx, patch in enumerate(patches):
+        groups.setdefault(patch.new_path or patch.old_path, []).append(idx)
+
+    results: list[tuple[bool, str]] = [(False, "")] * len(patches)
+    contents: list[str | None] = [None] * len(patches)
+
+    def _apply_group(indices: list[int]):
+        for idx in indices:
+            ok, msg, content = apply_patch(patches[idx], root)
+            results[idx] = (ok, msg)
+            if ok:
+                contents[idx] = content
+
+    if len(groups) > 1:
+        with ThreadPoolExecutor(max_workers=min(32, len(groups))) as ex:
+            list(ex.map(_apply_group, groups.values()))
+    else:
+        _apply_group(next(iter(groups.values())))
+
+    # apply_patch hands the final contents back — no need to re-read the
+    # files we just wrote. One transaction for all DB updates.
+    db_updates = [
+        (patch.new_path or patch.old_path, contents[idx])
+        for idx, patch in enumerate(patches)
+        if contents[idx] is not None and (patch.new_path or patch.old_path)
+    ]
+    if db_updates:
+        db.update_file_contents_bulk(codebase_id, db_updates)
 
     return results
 
@@ -238,17 +632,16 @@ def extract_diff_from_response(response: str) -> str:
     Looks for ```diff ... ``` fenced blocks first, then falls back to raw diff markers.
     """
     # Try fenced code block
-    fenced = re.search(r"```(?:diff)?\s*\n(.*?)```", response, re.DOTALL)
+    fenced = _FENCED_RE.search(response)
     if fenced:
         return fenced.group(1).strip()
 
-    # Fall back: find lines starting with ---, +++, @@, +, -
-    diff_lines = []
-    in_diff = False
-    for line in response.splitlines():
-        if line.startswith("--- ") or line.startswith("+++ "):
-            in_diff = True
-        if in_diff:
-            diff_lines.append(line)
+    # Fall back: everything from the first ---/+++ header onward. dropwhile
+    # skips the prose prefix in C instead of testing a flag per line.
+    prefixes = ("--- ", "+++ ")
+    diff_lines = list(itertools.dropwhile(
+        lambda l: not l.startswith(prefixes),
+        response.splitlines(),
+    ))
 
     return "\n".join(diff_lines).strip()